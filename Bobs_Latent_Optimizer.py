@@ -1,62 +1,135 @@
-from nodes import EmptyLatentImage
+import functools
+import math
+import re
+from types import MappingProxyType
+
+import comfy.model_management
 import torch
 
+# Target pixel area for each megapixel option
+_MP_TO_SIZE = MappingProxyType({
+    "1": 1024 * 1024,
+    "1.25": 1280 * 1024,
+    "1.5": 1440 * 1024,
+    "1.75": 1600 * 1024,
+    "2": 1920 * 1080
+})
+
+# Latent tensor dtype for each precision option
+_PRECISION_DTYPES = MappingProxyType({
+    "fp32": torch.float32,
+    "fp16": torch.float16,
+    "bf16": torch.bfloat16
+})
+
+# Smallest width/height emitted, so extreme ratios never produce an empty latent
+_MIN_DIM = 64
+
+_ASPECT_RATIO_RE = re.compile(r"^\s*(\d+)\s*:\s*(\d+)\s*$")
+
+
+def _parse_aspect_ratio(aspect_ratio):
+    """Parse an 'x:y' string into a pair of positive ints."""
+    match = _ASPECT_RATIO_RE.match(aspect_ratio)
+    if match is None:
+        raise ValueError(f"Invalid aspect ratio format: {aspect_ratio}. Please use the format 'x:y'.")
+    ratio_w, ratio_h = int(match.group(1)), int(match.group(2))
+    if ratio_w == 0 or ratio_h == 0:
+        raise ValueError(f"Invalid aspect ratio: {aspect_ratio}. Both sides must be greater than zero.")
+    return ratio_w, ratio_h
+
+
+def _floor64(value):
+    """Round a non-negative int down to a multiple of 64."""
+    return value & ~63
+
+
+def _round64(value):
+    """Round a non-negative int to the nearest multiple of 64."""
+    return (value + 32) & ~63
+
+
+# mode: (latent channels, 64px snap function or None, fixed target area or None)
+_MODE_SPECS = MappingProxyType({
+    "FLUX": (16, None, None),
+    "SDXL": (4, _floor64, None),
+    # SD3 always targets ~1MP; rounding to nearest keeps the area closest to it
+    "SD3": (16, _round64, 1024 * 1024)
+})
+
+
+@functools.lru_cache(maxsize=256)
+def _compute_dims(aspect_ratio, mp_size, mode):
+    """Return (width, height, latent_channels) for the given node inputs.
+
+    Pure function of the node inputs, so repeat queue runs skip the math.
+    """
+    ratio_w, ratio_h = _parse_aspect_ratio(aspect_ratio)
+    latent_channels, snap, fixed_area = _MODE_SPECS[mode]
+    target_area = fixed_area or _MP_TO_SIZE[mp_size]
+
+    # Solve each side from the area directly in exact integer math, so truncating
+    # one side never skews the other
+    target_width = math.isqrt(target_area * ratio_w // ratio_h)
+    target_height = math.isqrt(target_area * ratio_h // ratio_w)
+
+    if snap is not None:
+        target_width = snap(target_width)
+        target_height = snap(target_height)
+    target_width = max(_MIN_DIM, target_width)
+    target_height = max(_MIN_DIM, target_height)
+
+    return target_width, target_height, latent_channels
+
+
 class BobsFluxSDXLLatentNode:
     def __init__(self):
         pass
 
+    _INPUT_TYPES = {
+        "required": {
+            "aspect_ratio": ("STRING", {"default": "1:1"}),
+            "mp_size": (list(_MP_TO_SIZE), {"default": "1"}),
+            "upscale_by": ("FLOAT", {
+                "default": 2.0,
+                "min": 1.0,
+                "max": 10.0,
+                "step": .01
+            }),
+            "mode": (list(_MODE_SPECS), {"default": "FLUX"}),
+            "batch_size": ("INT", {"default": 1, "min": 1, "max": 64, "step": 1})  # New batch size input
+        },
+        # Inputs added later are optional so older saved prompts still validate
+        "optional": {
+            "precision": (list(_PRECISION_DTYPES), {"default": "fp32"}),
+            "share_batch_zeros": ("BOOLEAN", {"default": False})
+        }
+    }
+
     @classmethod
     def INPUT_TYPES(cls):
-        return {
-            "required": {
-                "aspect_ratio": ("STRING", {"default": "1:1"}),
-                "mp_size": (["1", "1.25", "1.5", "1.75", "2"], {"default": "1"}),
-                "upscale_by": ("FLOAT", {
-                    "default": 2.0,
-                    "min": 1.0,
-                    "max": 10.0,
-                    "step": .01
-                }),
-                "mode": (["FLUX", "SDXL", "SD3"], {"default": "FLUX"}),
-                "batch_size": ("INT", {"default": 1, "min": 1, "max": 64, "step": 1})  # New batch size input
-            }
-        }
+        return cls._INPUT_TYPES
 
     RETURN_TYPES = ("LATENT", "INT", "INT", "FLOAT")
     RETURN_NAMES = ("latent", "tile_width", "tile_height", "upscale_by")
     FUNCTION = "generate"
 
-    def generate(self, aspect_ratio, mp_size, upscale_by, mode, batch_size):  # Added batch_size parameter
-        try:
-            ratio_w, ratio_h = map(int, aspect_ratio.split(":"))
-        except ValueError:
-            raise ValueError(f"Invalid aspect ratio format: {aspect_ratio}. Please use the format 'x:y'.")
-
-        mp_to_size = {
-            "1": 1024 * 1024,
-            "1.25": 1280 * 1024,
-            "1.5": 1440 * 1024,
-            "1.75": 1600 * 1024,
-            "2": 1920 * 1080
-        }
-
-        target_area = mp_to_size[mp_size]
-        aspect_ratio_multiplier = (ratio_w / ratio_h)
-
-        target_width = int((target_area * aspect_ratio_multiplier) ** 0.5)
-        target_height = int(target_width / aspect_ratio_multiplier)
-
-        if mode == "SDXL" or mode == "SD3":
-            target_width = (target_width // 64) * 64
-            target_height = (target_height // 64) * 64
+    def generate(self, aspect_ratio, mp_size, upscale_by, mode, batch_size,
+                 precision="fp32", share_batch_zeros=False):  # Optional inputs default as in INPUT_TYPES
+        target_width, target_height, latent_channels = _compute_dims(aspect_ratio, mp_size, mode)
 
-            if mode == "SD3":
-                target_area_sd3 = 1024 * 1024
-                scaling_factor = (target_area_sd3 / (target_width * target_height)) ** 0.5
-                target_width = int(target_width * scaling_factor) // 64 * 64
-                target_height = int(target_height * scaling_factor) // 64 * 64
+        # With share_batch_zeros one zero sample is allocated and expanded across the
+        # batch; every item aliases the same memory, so in-place writes to it raise
+        alloc_batch = 1 if share_batch_zeros else batch_size
+        shape = [alloc_batch, latent_channels, target_height // 8, target_width // 8]
+        device = comfy.model_management.intermediate_device()
+        dtype = _PRECISION_DTYPES[precision]
 
-        latent = EmptyLatentImage().generate(target_width, target_height, batch_size)[0]  # Updated to use batch_size
+        # Samplers add noise on top of the latent, so it must stay zero-filled
+        latent_tensor = torch.zeros(shape, dtype=dtype, device=device)
+        if share_batch_zeros:
+            latent_tensor = latent_tensor.expand(batch_size, -1, -1, -1)
+        latent = {"samples": latent_tensor}
 
         tile_width = int(target_width * upscale_by) // 2
         tile_height = int(target_height * upscale_by) // 2
@@ -5,5 +5,5 @@ NODE_CLASS_MAPPINGS = {
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "Bobs-Latent": "Bobs Latent Optimizer"
+    "BobsFluxSDXLLatentNode": "Bobs Latent Optimizer"
 }